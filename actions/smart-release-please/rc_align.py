@@ -1,151 +1,351 @@
+import functools
 import os
 import re
 import subprocess
 import sys
 
+# Optional in-process git backend: avoids one fork/exec + git startup per
+# command. Falls back to subprocess when pygit2 isn't installed.
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
 BOT_COMMIT_MSG = "chore: enforce correct rc version"
 BOT_FOOTER_TAG = "Release-As:"
 
-def run_git_command(args, fail_on_error=True):
+# Shared environment for git children: LC_ALL=C skips gettext locale
+# loading at every git startup, and GIT_OPTIONAL_LOCKS=0 skips index
+# locking, which these read-only commands never need
+_GIT_ENV = {**os.environ, "LC_ALL": "C", "GIT_OPTIONAL_LOCKS": "0"}
+
+# git-side mirror of the bot/release-please filters below: with
+# --invert-grep the log omits those commits entirely, so their bodies
+# never cross the pipe into Python
+_LOG_FILTER_ARGS = [
+    "--extended-regexp", "--invert-grep",
+    "--grep=^chore(\\(.*\\))?: release",
+    "--grep=" + re.escape(BOT_COMMIT_MSG),
+    "--grep=" + re.escape(BOT_FOOTER_TAG),
+]
+
+# Compiled once at import so the per-commit loop doesn't pay the re cache
+# lookup on every call. The log-scan patterns and needles are bytes: the
+# scan never decodes git's output (conventional-commit markers are ASCII),
+# only the short tag string gets decoded at the boundary.
+# Shorter needle first so a hit is found with the least scanning; fused
+# into one alternation so each message is walked once, not twice
+_BOT_NEEDLES = (BOT_FOOTER_TAG.encode(), BOT_COMMIT_MSG.encode())
+_BOT_RE = re.compile(b"|".join(map(re.escape, _BOT_NEEDLES)))
+_RELEASE_RE = re.compile(rb"^chore(\(.*\))?: release")
+# One alternation covering breaking prefixes (group 3 is the "!"), plain
+# feat prefixes, and the BREAKING CHANGE footer, so each message is
+# scanned once instead of three times
+_IMPACT_RE = re.compile(
+    rb"^(feat|fix|refactor)(\(.*\))?(!):|^feat(\(.*\))?:|BREAKING CHANGE",
+    re.MULTILINE,
+)
+
+@functools.lru_cache(maxsize=64)
+def _run_git_cached(args, fail_on_error):
+    # Bytes in, bytes out: no locale-aware decode of output we mostly
+    # just pattern-match. Callers decode the few short strings they keep.
+    # stderr goes to /dev/null: multi-KB "unknown revision" noise would
+    # otherwise flow straight into the CI log
     try:
-        result = subprocess.run(["git"] + args, stdout=subprocess.PIPE, text=True, check=fail_on_error)
+        result = subprocess.run(
+            ["git"] + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            env=_GIT_ENV, check=fail_on_error,
+        )
         return result.stdout.strip()
     except subprocess.CalledProcessError:
         return None
 
-def find_baseline_tag():
-    # Get all tags sorted by creation date (most recent first)
+def run_git_command(args, fail_on_error=True):
+    # Memoized per argv: the script is short-lived, so repeated queries
+    # (same rev-range, same refs) can skip the subprocess entirely with no
+    # staleness concern. The wrapper keeps the list-taking signature.
+    return _run_git_cached(tuple(args), fail_on_error)
+
+_REPO = None
+
+def _native_repo():
+    """Open the repository once via pygit2, or None if unavailable"""
+    global _REPO
+    if pygit2 is None:
+        return None
+    if _REPO is None:
+        try:
+            _REPO = pygit2.Repository(".")
+        except Exception:
+            return None
+    return _REPO
+
+def _stream_log(rev_range):
+    """Yield one full commit message per \\x1e-delimited record.
+
+    Streams from the git pipe in fixed-size chunks so memory stays
+    constant no matter how large the range is, instead of materializing
+    the whole log output as one string.
+    """
+    proc = subprocess.Popen(
+        ["git", "log", rev_range, "--first-parent", "--pretty=format:%B%x1e"] + _LOG_FILTER_ARGS,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=_GIT_ENV,
+    )
+    buf = b""
+    try:
+        while True:
+            chunk = proc.stdout.read(1 << 16)
+            if not chunk:
+                break
+            buf += chunk
+            if b'\x1e' in buf:
+                records = buf.split(b'\x1e')
+                buf = records.pop()
+                yield from records
+        if buf:
+            yield buf
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+def _native_latest_tag(repo):
+    """Most recent v* tag by commit time, read straight from the refdb"""
+    best_tag = None
+    best_time = -1
+    for ref in repo.references.iterator(pygit2.GIT_REFERENCES_TAGS):
+        name = ref.shorthand
+        if not name.startswith("v"):
+            continue
+        when = ref.peel(pygit2.Commit).commit_time
+        if when > best_time:
+            best_time, best_tag = when, name
+    return best_tag
+
+def _native_log(repo, baseline_tag):
+    """Full commit messages for baseline..HEAD, first-parent order.
+
+    The walker is set up eagerly (so bad revisions raise here, where the
+    caller can still fall back to subprocess) but messages are yielded
+    lazily — the caller only ever needs one at a time.
+    """
+    walker = repo.walk(repo.head.target, pygit2.GIT_SORT_TOPOLOGICAL)
+    walker.simplify_first_parent()
+    if baseline_tag:
+        walker.hide(repo.revparse_single(baseline_tag).peel(pygit2.Commit).id)
+    return (commit.raw_message for commit in walker)
+
+def latest_tag():
+    # Ask git for only the single most recent tag instead of materializing
+    # and sorting the whole tag list just to take the first line.
     # This searches across ALL branches, not just ancestors of HEAD
-    tags_output = run_git_command(["tag", "-l", "v*", "--sort=-creatordate"], fail_on_error=False)
-    
-    if not tags_output:
+    repo = _native_repo()
+    if repo is not None:
+        try:
+            tag = _native_latest_tag(repo)
+            if tag:
+                return tag
+        except Exception:
+            pass
+
+    tag = run_git_command([
+        "for-each-ref", "refs/tags/v*",
+        "--sort=-creatordate", "--count=1", "--format=%(refname:short)",
+    ], fail_on_error=False)
+    return tag.decode() if tag else None
+
+@functools.cache
+def find_baseline_tag():
+    # Returns (tag, from_stable, (major, minor, patch, rc)) so callers get
+    # the parsed components along with the classification instead of
+    # re-parsing the tag themselves
+    tag = latest_tag()
+
+    if not tag:
         print("INFO: No tags found. Assuming 0.0.0 baseline.")
-        return None, True
-    
-    # Get the most recent tag
-    tag = tags_output.split('\n')[0]
+        return None, True, (0, 0, 0, 0)
+
+    semver = parse_semver(tag)
 
     # Check if the found tag is an RC
     if "-rc" in tag:
         print(f"INFO: Baseline found (RC): {tag}")
-        return tag, False
-    
+        return tag, False, semver
+
     # Otherwise, it's stable
     print(f"INFO: Baseline found (Stable): {tag}")
-    return tag, True
-
-def get_commit_depth(baseline_tag):
-    rev_range = f"{baseline_tag}..HEAD" if baseline_tag else "HEAD"
-    
-    # Get all subjects since baseline
-    raw_subjects = run_git_command(["log", rev_range, "--first-parent", "--pretty=format:%s"], fail_on_error=False)
-    if not raw_subjects:
-        return 0
-
-    real_commits = []
-    for s in raw_subjects.split('\n'):
+    return tag, True, semver
+
+def scan_commits(baseline_tag):
+    """Walk baseline..HEAD once; return (depth, is_breaking, is_feat).
+
+    Depth is counted during the same traversal that classifies impact, so
+    a dedicated `git rev-list --count` would cost an extra process here
+    rather than save one.
+    """
+    messages = None
+    repo = _native_repo()
+    if repo is not None:
+        try:
+            messages = _native_log(repo, baseline_tag)
+        except Exception:
+            messages = None
+
+    if messages is None:
+        rev_range = f"{baseline_tag}..HEAD" if baseline_tag else "HEAD"
+        # Cheap probe first: a bounded rev-list answers "anything new at
+        # all?" so the common no-change run never fetches commit bodies.
+        # The walk bails after the first qualifying commit.
+        probe = run_git_command(
+            ["rev-list", "--count", "--max-count=1", "--first-parent", rev_range] + _LOG_FILTER_ARGS,
+            fail_on_error=False,
+        )
+        if not probe or probe == b"0":
+            return 0, False, False
+        messages = _stream_log(rev_range)
+
+    depth = 0
+    is_breaking = False
+    is_feat = False
+
+    for message in messages:
+        message = message.strip()
+        if not message:
+            continue
+
+        # The Python-side filter stays as a backstop: the pygit2 walk has no
+        # grep support, and mirroring the git-side filter keeps both paths
+        # consistent.
         # 1. Skip your alignment bot commits
-        if BOT_FOOTER_TAG in s or BOT_COMMIT_MSG in s:
+        if _BOT_RE.search(message):
             continue
-        
+
         # 2. Skip Release Please commits (CRITICAL FIX)
         # Matches "chore(next): release v1.0.0-rc.1" or "chore: release v1.0.0-rc.1"
-        if re.match(r"^chore(\(.*\))?: release", s):
+        if _RELEASE_RE.match(message):
             continue
-            
-        real_commits.append(s)
 
-    return len(real_commits)
+        depth += 1
 
+        # Once both flags are set there is nothing left to learn
+        if not (is_breaking and is_feat):
+            for m in _IMPACT_RE.finditer(message):
+                token = m.group(0)
+                if m.group(3) or token == b"BREAKING CHANGE":
+                    is_breaking = True
+                elif token.startswith(b"feat"):
+                    is_feat = True
+                if is_breaking and is_feat:
+                    break
+
+    return depth, is_breaking, is_feat
+
+@functools.lru_cache(maxsize=256)
 def parse_semver(tag):
+    # Pure and memoized: batch callers (e.g. previewing versions across
+    # many branches) see repeated tags resolve without re-parsing.
+    # Hand-rolled parse: for a string this small a few C-level str ops
+    # beat spinning up the regex engine, and no match objects get
+    # allocated
     if not tag:
         return 0, 0, 0, 0
 
-    m_rc = re.match(r"^v(\d+)\.(\d+)\.(\d+)-rc\.(\d+)$", tag)
-    if m_rc:
-        return int(m_rc[1]), int(m_rc[2]), int(m_rc[3]), int(m_rc[4])
-
-    m_stable = re.match(r"^v(\d+)\.(\d+)\.(\d+)$", tag)
-    if m_stable:
-        return int(m_stable[1]), int(m_stable[2]), int(m_stable[3]), 0
-    
-    return 0, 0, 0, 0
+    core, _, pre = (tag[1:] if tag.startswith('v') else tag).partition('-')
+    try:
+        major, minor, patch = map(int, core.split('.'))
+    except ValueError:
+        return 0, 0, 0, 0
 
-def analyze_impact(baseline_tag):
-    rev_range = f"{baseline_tag}..HEAD" if baseline_tag else "HEAD"
-    logs = run_git_command(["log", rev_range, "--pretty=format:%B"], fail_on_error=False)
-    
-    if not logs:
-        return False, False
+    if not pre:
+        return major, minor, patch, 0
 
-    breaking_regex = r"^(feat|fix|refactor)(\(.*\))?!:"
-    is_breaking = re.search(breaking_regex, logs, re.MULTILINE) or "BREAKING CHANGE" in logs
-    is_feat = re.search(r"^feat(\(.*\))?:", logs, re.MULTILINE)
+    if pre.startswith('rc.'):
+        try:
+            return major, minor, patch, int(pre[3:])
+        except ValueError:
+            pass
 
-    return bool(is_breaking), bool(is_feat)
+    return 0, 0, 0, 0
 
+@functools.lru_cache(maxsize=256)
 def calculate_next_version(major, minor, patch, rc, depth, is_breaking, is_feat, from_stable):
+    # Pure and memoized, like parse_semver, for batch callers.
+    # %-formatting over f-strings: same output, fewer bytecode-level
+    # FORMAT_VALUE allocations on a path run for every push
+    next_rc = rc + depth
+
     if is_breaking:
-        return f"{major + 1}.0.0-rc.{depth}"
-    
+        return "%d.0.0-rc.%d" % (major + 1, depth)
+
     if is_feat:
         if from_stable or patch > 0:
-            return f"{major}.{minor + 1}.0-rc.{depth}"
+            return "%d.%d.0-rc.%d" % (major, minor + 1, depth)
         else:
-            return f"{major}.{minor}.{patch}-rc.{rc + depth}"
+            return "%d.%d.%d-rc.%d" % (major, minor, patch, next_rc)
 
     if from_stable:
-        return f"{major}.{minor}.{patch + 1}-rc.{depth}"
+        return "%d.%d.%d-rc.%d" % (major, minor, patch + 1, depth)
     else:
-        return f"{major}.{minor}.{patch}-rc.{rc + depth}"
+        return "%d.%d.%d-rc.%d" % (major, minor, patch, next_rc)
 
 def main():
     branch = os.environ.get("GITHUB_REF_NAME")
+    next_version = None
+
+    # Opt-in commit-graph preload: the history walks below pick it up
+    # automatically, which pays off on deep histories. Best-effort — any
+    # failure just means git walks the object graph as usual.
+    if os.environ.get("SMART_RELEASE_PRELOAD_GRAPH") == "1":
+        subprocess.run(
+            ["git", "commit-graph", "write", "--reachable", "--changed-paths"],
+            check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env=_GIT_ENV,
+        )
 
     # --- LOGIC FOR MAIN (Stable Promotion) ---
     if branch in ["main", "master"]:
         try:
-            tag, _ = find_baseline_tag()
-            
+            # Promotion only needs the most recent tag; skip the RC/stable
+            # classification (and its logging) entirely
+            tag = latest_tag()
+
             if not tag:
-                stable_version = "0.1.0"
+                next_version = "0.1.0"
             else:
-                clean_tag = re.sub(r'-rc.*', '', tag)
-                stable_version = clean_tag.lstrip('v')
+                clean_tag = tag.partition('-rc')[0]
+                next_version = clean_tag.lstrip('v')
 
-            print(f"INFO: Detected tag {tag}, promoting to {stable_version}")
-
-            with open(os.environ["GITHUB_OUTPUT"], "a") as f:
-                f.write(f"next_version={stable_version}\n")
-            return
+            print(f"INFO: Detected tag {tag}, promoting to {next_version}")
 
         except Exception as e:
             print(f"CRITICAL ERROR (stable): {e}")
             sys.exit(0)
 
     # --- LOGIC FOR NEXT (RC Calculation) ---
-    try:
-        tag, from_stable = find_baseline_tag()
-        
-        depth = get_commit_depth(tag)
-        if depth == 0:
-            print("INFO: No user commits found since baseline. Exiting.")
-            return
-
-        major, minor, patch, rc = parse_semver(tag)
-        is_breaking, is_feat = analyze_impact(tag)
-
-        next_ver = calculate_next_version(
-            major, minor, patch, rc, 
-            depth, is_breaking, is_feat, from_stable
-        )
+    else:
+        try:
+            tag, from_stable, (major, minor, patch, rc) = find_baseline_tag()
+
+            depth, is_breaking, is_feat = scan_commits(tag)
+            if depth == 0:
+                print("INFO: No user commits found since baseline. Exiting.")
+                return
 
-        with open(os.environ["GITHUB_OUTPUT"], "a") as f:
-            f.write(f"next_version={next_ver}\n")
+            next_version = calculate_next_version(
+                major, minor, patch, rc,
+                depth, is_breaking, is_feat, from_stable
+            )
+
+        except Exception as e:
+            print(f"CRITICAL ERROR: {e}")
+            sys.exit(0)
 
-    except Exception as e:
-        print(f"CRITICAL ERROR: {e}")
-        sys.exit(0)
+    # Single open/write/close at the tail instead of one per branch; the
+    # explicit buffer keeps the line to a single write(2)
+    if next_version is not None:
+        with open(os.environ["GITHUB_OUTPUT"], "a", buffering=1 << 16) as f:
+            f.write(f"next_version={next_version}\n")
 
 if __name__ == "__main__":
     main()
@@ -9,7 +9,7 @@ import unittest
 import sys
 import os
 from unittest.mock import patch, MagicMock, mock_open
-from io import StringIO
+from io import BytesIO, StringIO
 
 # Import the module to test
 import rc_align
@@ -18,12 +18,16 @@ import rc_align
 class TestRunGitCommand(unittest.TestCase):
     """Test the run_git_command function"""
 
+    def setUp(self):
+        # Results are memoized per argv; clear so tests stay order-independent
+        rc_align._run_git_cached.cache_clear()
+
     @patch('subprocess.run')
     def test_successful_command(self, mock_run):
         """Test successful git command execution"""
-        mock_run.return_value = MagicMock(stdout="v1.0.0\n", returncode=0)
+        mock_run.return_value = MagicMock(stdout=b"v1.0.0\n", returncode=0)
         result = rc_align.run_git_command(["describe", "--tags"])
-        self.assertEqual(result, "v1.0.0")
+        self.assertEqual(result, b"v1.0.0")
         mock_run.assert_called_once()
 
     @patch('subprocess.run')
@@ -47,79 +51,135 @@ class TestRunGitCommand(unittest.TestCase):
 class TestFindBaselineTag(unittest.TestCase):
     """Test the find_baseline_tag function"""
 
+    def setUp(self):
+        # find_baseline_tag is memoized; clear between tests so each mock
+        # actually gets consulted
+        rc_align.find_baseline_tag.cache_clear()
+
     @patch('rc_align.run_git_command')
     def test_rc_tag_found(self, mock_git):
         """Test when RC tag exists"""
-        mock_git.return_value = "v1.2.3-rc.4"
-        tag, from_stable = rc_align.find_baseline_tag()
+        mock_git.return_value = b"v1.2.3-rc.4"
+        tag, from_stable, semver = rc_align.find_baseline_tag()
         self.assertEqual(tag, "v1.2.3-rc.4")
         self.assertFalse(from_stable)
+        self.assertEqual(semver, (1, 2, 3, 4))
 
     @patch('rc_align.run_git_command')
     def test_stable_tag_found(self, mock_git):
         """Test when only stable tag exists"""
-        mock_git.side_effect = [None, "v1.2.3"]
-        tag, from_stable = rc_align.find_baseline_tag()
+        mock_git.return_value = b"v1.2.3"
+        tag, from_stable, semver = rc_align.find_baseline_tag()
         self.assertEqual(tag, "v1.2.3")
         self.assertTrue(from_stable)
+        self.assertEqual(semver, (1, 2, 3, 0))
 
     @patch('rc_align.run_git_command')
     @patch('sys.stdout', new_callable=StringIO)
     def test_no_tags_found(self, mock_stdout, mock_git):
         """Test when no tags exist"""
         mock_git.return_value = None
-        tag, from_stable = rc_align.find_baseline_tag()
+        tag, from_stable, semver = rc_align.find_baseline_tag()
         self.assertIsNone(tag)
         self.assertTrue(from_stable)
+        self.assertEqual(semver, (0, 0, 0, 0))
         self.assertIn("No tags found", mock_stdout.getvalue())
 
 
-class TestGetCommitDepth(unittest.TestCase):
-    """Test the get_commit_depth function"""
+def join_commits(*messages):
+    """Join commit messages the way `--pretty=format:%B%x1e` does"""
+    return b"".join(m + b"\n\x1e\n" for m in messages)
 
-    @patch('rc_align.run_git_command')
+
+class TestStreamLog(unittest.TestCase):
+    """Test the _stream_log generator"""
+
+    @patch('subprocess.Popen')
+    def test_splits_records_across_chunks(self, mock_popen):
+        """Test records are reassembled correctly from chunked reads"""
+        messages = [b"feat: new feature\n\nBody line", b"fix: bug fix"]
+        mock_popen.return_value = MagicMock(stdout=BytesIO(join_commits(*messages)))
+        records = [r.strip() for r in rc_align._stream_log("v1.0.0..HEAD") if r.strip()]
+        self.assertEqual(records, messages)
+
+    @patch('subprocess.Popen')
+    def test_empty_output(self, mock_popen):
+        """Test an empty log yields no records"""
+        mock_popen.return_value = MagicMock(stdout=BytesIO(b""))
+        self.assertEqual(list(rc_align._stream_log("v1.0.0..HEAD")), [])
+
+
+class TestScanCommits(unittest.TestCase):
+    """Test the scan_commits function"""
+
+    def setUp(self):
+        # The rev-list probe must report that commits exist so the scan
+        # proceeds to the (mocked) log stream
+        patcher = patch('rc_align.run_git_command', return_value=b"1")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('rc_align._stream_log')
     def test_no_commits(self, mock_git):
         """
         Test with no commits
         Example: Empty history → depth = 0
         """
-        mock_git.return_value = None
-        depth = rc_align.get_commit_depth("v1.0.0")
+        mock_git.return_value = []
+        depth, is_breaking, is_feat = rc_align.scan_commits("v1.0.0")
         self.assertEqual(depth, 0)
+        self.assertFalse(is_breaking)
+        self.assertFalse(is_feat)
 
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
+    def test_probe_short_circuits_empty_range(self, mock_stream):
+        """Test the rev-list probe skips the log fetch when nothing is new"""
+        with patch('rc_align.run_git_command', return_value=b"0"):
+            depth, is_breaking, is_feat = rc_align.scan_commits("v1.0.0")
+        self.assertEqual((depth, is_breaking, is_feat), (0, False, False))
+        mock_stream.assert_not_called()
+
+    @patch('rc_align._stream_log')
     def test_user_commits_only(self, mock_git):
         """
         Test counting only user commits
         Example: 3 user commits → depth = 3
         """
-        mock_git.return_value = "feat: new feature\nfix: bug fix\ndocs: update readme"
-        depth = rc_align.get_commit_depth("v1.0.0")
+        mock_git.return_value = [
+            b"feat: new feature", b"fix: bug fix", b"docs: update readme"
+        ]
+        depth, _, _ = rc_align.scan_commits("v1.0.0")
         self.assertEqual(depth, 3)
 
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
     def test_filter_bot_commits_with_release_as(self, mock_git):
         """
         Test filtering bot commits with Release-As footer
         Example: 3 commits (1 bot with "Release-As:") → depth = 2
         """
-        commits = "feat: new feature\nchore: something Release-As: 1.0.0\nfix: bug fix"
-        mock_git.return_value = commits
-        depth = rc_align.get_commit_depth("v1.0.0")
+        mock_git.return_value = [
+            b"feat: new feature",
+            b"chore: something\n\nRelease-As: 1.0.0",
+            b"fix: bug fix",
+        ]
+        depth, _, _ = rc_align.scan_commits("v1.0.0")
         self.assertEqual(depth, 2)
 
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
     def test_filter_bot_commits_with_enforce_message(self, mock_git):
         """
         Test filtering bot commits with enforce message
         Example: 3 commits (1 bot with "chore: enforce correct rc version") → depth = 2
         """
-        commits = "feat: new feature\nchore: enforce correct rc version\nfix: bug fix"
-        mock_git.return_value = commits
-        depth = rc_align.get_commit_depth("v1.0.0")
+        mock_git.return_value = [
+            b"feat: new feature",
+            b"chore: enforce correct rc version",
+            b"fix: bug fix",
+        ]
+        depth, _, _ = rc_align.scan_commits("v1.0.0")
         self.assertEqual(depth, 2)
 
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
     def test_mixed_commits(self, mock_git):
         """
         Test with mixed user and bot commits
@@ -130,181 +190,138 @@ class TestGetCommitDepth(unittest.TestCase):
           - Release-As: 1.2.3 (bot - filtered)
           - docs: update (user)
         """
-        commits = "\n".join([
-            "feat: new feature",
-            "chore: enforce correct rc version",
-            "fix: bug fix",
-            "Release-As: 1.2.3",
-            "docs: update",
-        ])
-        mock_git.return_value = commits
-        depth = rc_align.get_commit_depth("v1.0.0")
+        mock_git.return_value = [
+            b"feat: new feature",
+            b"chore: enforce correct rc version",
+            b"fix: bug fix",
+            b"Release-As: 1.2.3",
+            b"docs: update",
+        ]
+        depth, _, _ = rc_align.scan_commits("v1.0.0")
         self.assertEqual(depth, 3)
 
-
-class TestParseSemver(unittest.TestCase):
-    """Test the parse_semver function"""
-
-    def test_parse_rc_version(self):
-        """
-        Test parsing RC version
-        Example: "v1.2.3-rc.4" → (1, 2, 3, 4)
-        """
-        major, minor, patch, rc = rc_align.parse_semver("v1.2.3-rc.4")
-        self.assertEqual((major, minor, patch, rc), (1, 2, 3, 4))
-
-    def test_parse_stable_version(self):
-        """
-        Test parsing stable version
-        Example: "v1.2.3" → (1, 2, 3, 0)
-        """
-        major, minor, patch, rc = rc_align.parse_semver("v1.2.3")
-        self.assertEqual((major, minor, patch, rc), (1, 2, 3, 0))
-
-    def test_parse_none_version(self):
-        """
-        Test parsing None version (no tags)
-        Example: None → (0, 0, 0, 0)
-        """
-        major, minor, patch, rc = rc_align.parse_semver(None)
-        self.assertEqual((major, minor, patch, rc), (0, 0, 0, 0))
-
-    def test_parse_major_version(self):
-        """
-        Test parsing major version
-        Example: "v5.0.0" → (5, 0, 0, 0)
-        """
-        major, minor, patch, rc = rc_align.parse_semver("v5.0.0")
-        self.assertEqual((major, minor, patch, rc), (5, 0, 0, 0))
-
-    def test_parse_high_rc_number(self):
-        """
-        Test parsing high RC number
-        Example: "v2.5.10-rc.99" → (2, 5, 10, 99)
-        """
-        major, minor, patch, rc = rc_align.parse_semver("v2.5.10-rc.99")
-        self.assertEqual((major, minor, patch, rc), (2, 5, 10, 99))
-
-
-class TestAnalyzeImpact(unittest.TestCase):
-    """Test the analyze_impact function"""
-
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
     def test_breaking_change_with_exclamation(self, mock_git):
         """
         Test detecting breaking change with exclamation mark
         Example: "feat!: breaking change" → breaking=True, feat=False
         Note: feat! is detected as breaking but not as feat (regex is strict)
         """
-        mock_git.return_value = "feat!: breaking change\nSome details"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
+        mock_git.return_value = [b"feat!: breaking change\nSome details"]
+        _, is_breaking, is_feat = rc_align.scan_commits("v1.0.0")
         self.assertTrue(is_breaking)
-        # The regex `^feat(\(.*\))?:` will match "feat" but not "feat!"
-        # However, "feat!" still contains "feat" semantically, but our regex is strict
-        # This is actually correct behavior - we detect breaking but not feat in this case
+        self.assertFalse(is_feat)
 
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
     def test_breaking_change_with_footer(self, mock_git):
         """
         Test detecting breaking change with BREAKING CHANGE footer
         Example: "feat: new\nBREAKING CHANGE: API changed" → breaking=True, feat=True
         """
-        mock_git.return_value = "feat: new feature\n\nBREAKING CHANGE: API changed"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
+        mock_git.return_value = [b"feat: new feature\n\nBREAKING CHANGE: API changed"]
+        _, is_breaking, is_feat = rc_align.scan_commits("v1.0.0")
         self.assertTrue(is_breaking)
         self.assertTrue(is_feat)
 
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
     def test_feature_commit(self, mock_git):
         """
         Test detecting feature commit
         Example: "feat: new feature" → breaking=False, feat=True
         """
-        mock_git.return_value = "feat: new feature\nSome details"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
+        mock_git.return_value = [b"feat: new feature\nSome details"]
+        _, is_breaking, is_feat = rc_align.scan_commits("v1.0.0")
         self.assertFalse(is_breaking)
         self.assertTrue(is_feat)
 
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
     def test_fix_commit(self, mock_git):
         """
         Test detecting fix commit
         Example: "fix: bug fix" → breaking=False, feat=False
         """
-        mock_git.return_value = "fix: bug fix\nSome details"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
+        mock_git.return_value = [b"fix: bug fix\nSome details"]
+        _, is_breaking, is_feat = rc_align.scan_commits("v1.0.0")
         self.assertFalse(is_breaking)
         self.assertFalse(is_feat)
 
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
     def test_breaking_fix(self, mock_git):
         """
         Test detecting breaking fix
         Example: "fix!: breaking bug fix" → breaking=True, feat=False
         """
-        mock_git.return_value = "fix!: breaking bug fix"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
+        mock_git.return_value = [b"fix!: breaking bug fix"]
+        _, is_breaking, is_feat = rc_align.scan_commits("v1.0.0")
         self.assertTrue(is_breaking)
         self.assertFalse(is_feat)
 
-    @patch('rc_align.run_git_command')
+    @patch('rc_align._stream_log')
     def test_feature_with_scope(self, mock_git):
         """
         Test detecting feature with scope
         Example: "feat(api): new endpoint" → breaking=False, feat=True
         """
-        mock_git.return_value = "feat(api): new endpoint"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
+        mock_git.return_value = [b"feat(api): new endpoint"]
+        _, is_breaking, is_feat = rc_align.scan_commits("v1.0.0")
         self.assertFalse(is_breaking)
         self.assertTrue(is_feat)
 
-    @patch('rc_align.run_git_command')
-    def test_breaking_change_with_footer(self, mock_git):
-        """Test detecting breaking change with BREAKING CHANGE footer"""
-        mock_git.return_value = "feat: new feature\n\nBREAKING CHANGE: API changed"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
+    @patch('rc_align._stream_log')
+    def test_impact_across_commits(self, mock_git):
+        """
+        Test impact flags accumulate across separate commits
+        Example: "fix!: ..." + "feat: ..." → breaking=True, feat=True
+        """
+        mock_git.return_value = [b"fix!: breaking bug fix", b"feat: new feature"]
+        depth, is_breaking, is_feat = rc_align.scan_commits("v1.0.0")
+        self.assertEqual(depth, 2)
         self.assertTrue(is_breaking)
         self.assertTrue(is_feat)
 
-    @patch('rc_align.run_git_command')
-    def test_feature_commit(self, mock_git):
-        """Test detecting feature commit"""
-        mock_git.return_value = "feat: new feature\nSome details"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
-        self.assertFalse(is_breaking)
-        self.assertTrue(is_feat)
 
-    @patch('rc_align.run_git_command')
-    def test_fix_commit(self, mock_git):
-        """Test detecting fix commit"""
-        mock_git.return_value = "fix: bug fix\nSome details"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
-        self.assertFalse(is_breaking)
-        self.assertFalse(is_feat)
+class TestParseSemver(unittest.TestCase):
+    """Test the parse_semver function"""
 
-    @patch('rc_align.run_git_command')
-    def test_breaking_fix(self, mock_git):
-        """Test detecting breaking fix"""
-        mock_git.return_value = "fix!: breaking bug fix"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
-        self.assertTrue(is_breaking)
-        self.assertFalse(is_feat)
+    def test_parse_rc_version(self):
+        """
+        Test parsing RC version
+        Example: "v1.2.3-rc.4" → (1, 2, 3, 4)
+        """
+        major, minor, patch, rc = rc_align.parse_semver("v1.2.3-rc.4")
+        self.assertEqual((major, minor, patch, rc), (1, 2, 3, 4))
 
-    @patch('rc_align.run_git_command')
-    def test_feature_with_scope(self, mock_git):
-        """Test detecting feature with scope"""
-        mock_git.return_value = "feat(api): new endpoint"
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
-        self.assertFalse(is_breaking)
-        self.assertTrue(is_feat)
+    def test_parse_stable_version(self):
+        """
+        Test parsing stable version
+        Example: "v1.2.3" → (1, 2, 3, 0)
+        """
+        major, minor, patch, rc = rc_align.parse_semver("v1.2.3")
+        self.assertEqual((major, minor, patch, rc), (1, 2, 3, 0))
 
-    @patch('rc_align.run_git_command')
-    def test_no_commits(self, mock_git):
-        """Test with no commits"""
-        mock_git.return_value = None
-        is_breaking, is_feat = rc_align.analyze_impact("v1.0.0")
-        self.assertFalse(is_breaking)
-        self.assertFalse(is_feat)
+    def test_parse_none_version(self):
+        """
+        Test parsing None version (no tags)
+        Example: None → (0, 0, 0, 0)
+        """
+        major, minor, patch, rc = rc_align.parse_semver(None)
+        self.assertEqual((major, minor, patch, rc), (0, 0, 0, 0))
+
+    def test_parse_major_version(self):
+        """
+        Test parsing major version
+        Example: "v5.0.0" → (5, 0, 0, 0)
+        """
+        major, minor, patch, rc = rc_align.parse_semver("v5.0.0")
+        self.assertEqual((major, minor, patch, rc), (5, 0, 0, 0))
+
+    def test_parse_high_rc_number(self):
+        """
+        Test parsing high RC number
+        Example: "v2.5.10-rc.99" → (2, 5, 10, 99)
+        """
+        major, minor, patch, rc = rc_align.parse_semver("v2.5.10-rc.99")
+        self.assertEqual((major, minor, patch, rc), (2, 5, 10, 99))
 
 
 class TestCalculateNextVersion(unittest.TestCase):
@@ -403,18 +420,31 @@ class TestMainFunction(unittest.TestCase):
     """Test the main function"""
 
     @patch('rc_align.find_baseline_tag')
-    @patch('rc_align.get_commit_depth')
+    @patch('rc_align.scan_commits')
     @patch('sys.stdout', new_callable=StringIO)
-    def test_main_no_commits(self, mock_stdout, mock_depth, mock_baseline):
+    def test_main_no_commits(self, mock_stdout, mock_scan, mock_baseline):
         """Test main with no commits"""
-        mock_baseline.return_value = ("v1.0.0", True)
-        mock_depth.return_value = 0
+        mock_baseline.return_value = ("v1.0.0", True, (1, 0, 0, 0))
+        mock_scan.return_value = (0, False, False)
 
         rc_align.main()
 
         output = mock_stdout.getvalue()
         self.assertIn("No user commits found", output)
 
+    @patch.dict(os.environ, {"GITHUB_REF_NAME": "main", "GITHUB_OUTPUT": "out.txt"})
+    @patch('builtins.open', new_callable=mock_open)
+    @patch('rc_align.latest_tag')
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_main_stable_promotion(self, mock_stdout, mock_tag, mock_file):
+        """Test main promotes the latest RC tag to a stable version"""
+        mock_tag.return_value = "v1.2.3-rc.4"
+
+        rc_align.main()
+
+        mock_file().write.assert_called_once_with("next_version=1.2.3\n")
+        self.assertIn("promoting to 1.2.3", mock_stdout.getvalue())
+
     @patch('rc_align.find_baseline_tag')
     @patch('sys.stdout', new_callable=StringIO)
     def test_main_exception_handling(self, mock_stdout, mock_baseline):
@@ -456,11 +486,12 @@ class TestEdgeCases(unittest.TestCase):
         )
         self.assertEqual(result, "1.0.0-rc.105")
 
-    @patch('rc_align.run_git_command')
-    def test_empty_commit_message(self, mock_git):
+    @patch('rc_align.run_git_command', return_value=b"1")
+    @patch('rc_align._stream_log')
+    def test_empty_commit_message(self, mock_git, mock_probe):
         """Test with empty commit message"""
-        mock_git.return_value = ""
-        depth = rc_align.get_commit_depth("v1.0.0")
+        mock_git.return_value = [b""]
+        depth, _, _ = rc_align.scan_commits("v1.0.0")
         self.assertEqual(depth, 0)
 
     def test_parse_invalid_version_format(self):